@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import statistics
+
+RUNS = int(os.environ.get("BENCH_RUNS", 10))
+SNAPSHOT_HABITS = int(os.environ.get("BENCH_SNAPSHOT_HABITS", 100))
+BENCH_USER_ID = 1
+
+
+def seed_home(home):
+    # Клиент видит «вошедшего» пользователя и его снимок, как при обычном запуске.
+    # Имена файлов совпадают с TOKEN_PATH и CACHE_PATH из main.py
+    with open(os.path.join(home, ".habit_tracker_token"), "w", encoding="utf-8") as f:
+        f.write(f"{BENCH_USER_ID}.bench")
+    habits = [
+        {
+            "id": n,
+            "name": f"Привычка {n}",
+            "description": "Описание",
+            "habit_type": "bad",
+            "frequency": "daily",
+            "target_count": 1,
+            "motivation_text": "Мотивация",
+            "difficulty_level": "medium",
+            "created_at": "2026-01-01 00:00:00",
+        }
+        for n in range(1, SNAPSHOT_HABITS + 1)
+    ]
+    with open(os.path.join(home, f".habit_tracker_cache_{BENCH_USER_ID}.json"), "w", encoding="utf-8") as f:
+        json.dump(habits, f, ensure_ascii=False)
+
+
+def measure(home):
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["USERPROFILE"] = home
+    env["HABIT_TRACKER_STARTUP_BENCH"] = repr(time.time())
+    result = subprocess.run(
+        [sys.executable, "main.py"],
+        env=env, capture_output=True, text=True, timeout=60,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("startup_ms="):
+            return float(line.split("=", 1)[1])
+    raise RuntimeError(f"main.py не сообщил время запуска:\n{result.stderr}")
+
+
+if __name__ == "__main__":
+    # Для запуска без дисплея: QT_QPA_PLATFORM=offscreen python bench_startup.py
+    with tempfile.TemporaryDirectory() as home:
+        seed_home(home)
+        samples = [measure(home) for _ in range(RUNS)]
+    print(f"Запуск до первого кадра со снимком из {SNAPSHOT_HABITS} привычек, {RUNS} прогонов:")
+    print(f"  медиана: {statistics.median(samples):.1f} мс")
+    print(f"  минимум: {min(samples):.1f} мс")
+    print(f"  максимум: {max(samples):.1f} мс")
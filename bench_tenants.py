@@ -0,0 +1,207 @@
+import os
+import random
+import statistics
+import sys
+import time
+
+# Бенчмарк работает с отдельной базой, чтобы не трогать рабочие данные
+BENCH_DB = os.environ.get("BENCH_DB", "priv_bench")
+os.environ["HABIT_TRACKER_DB"] = BENCH_DB
+
+import mysql.connector
+import server
+
+TENANT_STEPS = [10, 100, 1000, 10000, 100000]
+HABITS_PER_TENANT = 5
+COMPLETIONS_PER_HABIT = 5
+SAMPLES = int(os.environ.get("BENCH_SAMPLES", 200))
+BATCH = 5000
+
+# Один «тяжёлый» пользователь с большим числом заметок из случайного словаря
+HEAVY_NOTES = int(os.environ.get("BENCH_HEAVY_NOTES", 1000000))
+HEAVY_HABITS = 100
+VOCABULARY_SIZE = 20000
+LETTERS = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def create_database():
+    conn = mysql.connector.connect(host="localhost", user="root", password="123456789", port=3306)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DB}")
+    cursor.execute(f"CREATE DATABASE {BENCH_DB} CHARACTER SET utf8mb4")
+    cursor.execute(f"USE {BENCH_DB}")
+    cursor.execute('''
+        CREATE TABLE habits (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            description TEXT,
+            habit_type VARCHAR(20) DEFAULT 'bad',
+            frequency VARCHAR(20) DEFAULT 'daily',
+            target_count INT DEFAULT 1,
+            motivation_text TEXT,
+            difficulty_level VARCHAR(20) DEFAULT 'medium',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE habit_completions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            habit_id INT NOT NULL,
+            completion_date DATE NOT NULL,
+            completed BOOLEAN DEFAULT TRUE,
+            notes TEXT,
+            craving_level INT DEFAULT 0,
+            resistance_level INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_habit_date (habit_id, completion_date)
+        )
+    ''')
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def add_tenants(first_id, last_id):
+    conn = server.get_db_connection()
+    cursor = conn.cursor()
+    frequencies = ["daily", "weekly", "monthly"]
+
+    for start in range(first_id, last_id + 1, BATCH):
+        user_ids = range(start, min(start + BATCH, last_id + 1))
+        cursor.executemany(
+            'INSERT INTO users (id, username, password_hash) VALUES (%s, %s, %s)',
+            [(user_id, f"user{user_id}", "-") for user_id in user_ids]
+        )
+        cursor.executemany(
+            'INSERT INTO habits (user_id, name, description, frequency) VALUES (%s, %s, %s, %s)',
+            [(user_id, f"Привычка {n}", "Описание", frequencies[n % 3])
+             for user_id in user_ids for n in range(HABITS_PER_TENANT)]
+        )
+        cursor.execute(
+            'SELECT id, user_id FROM habits WHERE user_id BETWEEN %s AND %s',
+            (user_ids[0], user_ids[-1])
+        )
+        habits = cursor.fetchall()
+        today = time.strftime("%Y-%m-%d")
+        cursor.executemany(
+            'INSERT INTO habit_completions (user_id, habit_id, completion_date, notes) '
+            'VALUES (%s, %s, DATE_SUB(%s, INTERVAL %s DAY), %s)',
+            [(user_id, habit_id, today, day, "Заметка")
+             for habit_id, user_id in habits for day in range(COMPLETIONS_PER_HABIT)]
+        )
+        conn.commit()
+
+    cursor.close()
+    conn.close()
+
+
+def make_vocabulary():
+    rng = random.Random(1)
+    return sorted({
+        "".join(rng.choice(LETTERS) for _ in range(rng.randint(5, 10)))
+        for _ in range(VOCABULARY_SIZE)
+    })
+
+
+def add_heavy_tenant(user_id, vocabulary):
+    conn = server.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        'INSERT INTO users (id, username, password_hash) VALUES (%s, %s, %s)',
+        (user_id, f"user{user_id}", "-")
+    )
+    cursor.executemany(
+        'INSERT INTO habits (user_id, name, description) VALUES (%s, %s, %s)',
+        [(user_id, f"Привычка {n}", " ".join(random.sample(vocabulary, 3))) for n in range(HEAVY_HABITS)]
+    )
+    cursor.execute('SELECT id FROM habits WHERE user_id = %s', (user_id,))
+    habit_ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+
+    today = time.strftime("%Y-%m-%d")
+    # Дата уникальна для привычки, поэтому заметки раскладываются по дням назад
+    notes = ((user_id, habit_ids[n % HEAVY_HABITS], today, n // HEAVY_HABITS, " ".join(random.choices(vocabulary, k=6)))
+             for n in range(HEAVY_NOTES))
+    while True:
+        batch = [row for _, row in zip(range(BATCH), notes)]
+        if not batch:
+            break
+        cursor.executemany(
+            'INSERT INTO habit_completions (user_id, habit_id, completion_date, notes) '
+            'VALUES (%s, %s, DATE_SUB(%s, INTERVAL %s DAY), %s)',
+            batch
+        )
+        conn.commit()
+
+    cursor.close()
+    conn.close()
+
+
+def measure_heavy(user_id, vocabulary):
+    # Первый поиск строит индекс пользователя, дальнейшие идут по готовому индексу
+    started = time.perf_counter()
+    server.search(q=random.choice(vocabulary), user_id=user_id)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    timings = {"search: одно слово": [], "search: два слова": [], "search: префикс": []}
+    for _ in range(SAMPLES):
+        for name, q in (
+            ("search: одно слово", random.choice(vocabulary)),
+            ("search: два слова", " ".join(random.sample(vocabulary, 2))),
+            ("search: префикс", random.choice(vocabulary)[:3]),
+        ):
+            started = time.perf_counter()
+            server.search(q=q, user_id=user_id)
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return build_ms, timings
+
+
+def print_timings(label, timings):
+    for name, samples in timings.items():
+        samples.sort()
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print(f"{label:>14} {name:<24} {statistics.median(samples):>9.2f} {p95:>9.2f}")
+    sys.stdout.flush()
+
+
+def measure(tenants):
+    timings = {"get_habits": [], "get_analytics": [], "get_habit_completions": [], "search": []}
+    for _ in range(SAMPLES):
+        user_id = random.randint(1, tenants)
+        habit_id = (user_id - 1) * HABITS_PER_TENANT + 1
+
+        for name, call in (
+            ("get_habits", lambda: server.get_habits(user_id=user_id)),
+            ("get_analytics", lambda: server.get_analytics(user_id=user_id)),
+            ("get_habit_completions", lambda: server.get_habit_completions(habit_id, user_id=user_id)),
+            # Слово есть в заметках всех пользователей: поиск не должен дорожать с их числом.
+            # В замер входит построение небольшого индекса пользователя при первом обращении
+            ("search", lambda: server.search(q="Заметка", user_id=user_id)),
+        ):
+            started = time.perf_counter()
+            call()
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    max_tenants = int(os.environ.get("BENCH_MAX_TENANTS", TENANT_STEPS[-1]))
+    create_database()
+    server.ensure_schema()
+
+    loaded = 0
+    print(f"{'пользователей':>14} {'эндпоинт':<24} {'p50, мс':>9} {'p95, мс':>9}")
+    for tenants in TENANT_STEPS:
+        if tenants > max_tenants:
+            break
+        add_tenants(loaded + 1, tenants)
+        loaded = tenants
+
+        print_timings(tenants, measure(tenants))
+
+    heavy_user_id = loaded + 1
+    vocabulary = make_vocabulary()
+    add_heavy_tenant(heavy_user_id, vocabulary)
+    build_ms, timings = measure_heavy(heavy_user_id, vocabulary)
+    print(f"\nПользователь с {HEAVY_NOTES} заметками: построение индекса при первом поиске {build_ms:.0f} мс")
+    print_timings("тяжёлый", timings)
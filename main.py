@@ -1,26 +1,176 @@
 import sys
-import requests
+import os
+import json
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, date
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QHBoxLayout, QPushButton, QListWidget, QListWidgetItem,
                                QLabel, QLineEdit, QTextEdit, QComboBox, QDateEdit,
                                QMessageBox, QTabWidget, QProgressBar, QSlider,
-                               QGroupBox, QFormLayout, QScrollArea)
+                               QGroupBox, QFormLayout, QScrollArea, QDialog, QFileDialog)
 from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtGui import QFont
 import time
 
 
+API_BASE = 'http://localhost:8000'
+TOKEN_PATH = os.path.join(os.path.expanduser("~"), ".habit_tracker_token")
+# Снимок хранится отдельно для каждого пользователя
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".habit_tracker_cache_{}.json")
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+
+class RequestProfiler:
+    def __init__(self, enabled=False, max_records=500):
+        self.enabled = enabled
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    def record(self, kind, name, duration_ms, **fields):
+        if not self.enabled:
+            return
+        entry = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "kind": kind,
+            "name": name,
+            "duration_ms": round(duration_ms, 1),
+        }
+        entry.update(fields)
+        with self.lock:
+            self.records.append(entry)
+
+    @contextmanager
+    def render(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record("render", name, (time.perf_counter() - started) * 1000)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.records)
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+class ProfilerDialog(QDialog):
+    def __init__(self, profiler, parent=None):
+        super().__init__(parent)
+        self.profiler = profiler
+        self.setWindowTitle("Отладка: задержки запросов")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout(self)
+        self.output = QTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setFont(QFont("Courier New", 9))
+        layout.addWidget(self.output)
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.clicked.connect(self.refresh)
+        save_btn = QPushButton("Сохранить JSON")
+        save_btn.clicked.connect(self.save_json)
+        buttons.addWidget(refresh_btn)
+        buttons.addWidget(save_btn)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+
+        self.refresh()
+
+    def refresh(self):
+        lines = []
+        for entry in reversed(self.profiler.snapshot()):
+            if entry["kind"] == "request":
+                lines.append(
+                    f"{entry['time']}  {entry['name']:<16} {entry['duration_ms']:>8.1f} мс  "
+                    f"статус={entry.get('status')}  {entry.get('bytes', 0)} байт  "
+                    f"сервер={entry.get('server_timing') or '-'}  id={entry['request_id']}"
+                )
+            else:
+                lines.append(f"{entry['time']}  {entry['name']:<16} {entry['duration_ms']:>8.1f} мс  (отрисовка)")
+        self.output.setPlainText("\n".join(lines) or "Нет данных")
+
+    def save_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить профиль", "profile.json", "JSON (*.json)")
+        if path:
+            self.profiler.dump_json(path)
+
+
+class LoginDialog(QDialog):
+    def __init__(self, api_base, parent=None):
+        super().__init__(parent)
+        self.api_base = api_base
+        self.token = None
+        self.setWindowTitle("Вход")
+
+        layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+        self.username_input = QLineEdit()
+        form_layout.addRow("Имя пользователя:", self.username_input)
+        self.password_input = QLineEdit()
+        self.password_input.setEchoMode(QLineEdit.Password)
+        form_layout.addRow("Пароль:", self.password_input)
+        layout.addLayout(form_layout)
+
+        buttons = QHBoxLayout()
+        login_btn = QPushButton("Войти")
+        login_btn.clicked.connect(lambda: self.authenticate("/users/login/"))
+        register_btn = QPushButton("Регистрация")
+        register_btn.clicked.connect(lambda: self.authenticate("/users/register/"))
+        buttons.addWidget(login_btn)
+        buttons.addWidget(register_btn)
+        layout.addLayout(buttons)
+
+    def authenticate(self, path):
+        import requests
+        credentials = {
+            "username": self.username_input.text().strip(),
+            "password": self.password_input.text()
+        }
+        if not credentials["username"] or not credentials["password"]:
+            QMessageBox.warning(self, "Ошибка", "Введите имя пользователя и пароль")
+            return
+
+        try:
+            r = requests.post(f"{self.api_base}{path}", json=credentials, timeout=5)
+        except requests.exceptions.RequestException:
+            QMessageBox.warning(self, "Ошибка", "Сервер не доступен")
+            return
+
+        if r.status_code == 200:
+            self.token = r.json()["token"]
+            self.accept()
+        elif r.status_code == 409:
+            QMessageBox.warning(self, "Ошибка", "Имя пользователя уже занято")
+        elif r.status_code == 401:
+            QMessageBox.warning(self, "Ошибка", "Неверное имя пользователя или пароль")
+        else:
+            QMessageBox.warning(self, "Ошибка", "Не удалось войти")
+
+
 class ApiWorker(QThread):
     habits_loaded = Signal(list)
     analytics_loaded = Signal(dict)
     completion_saved = Signal(bool, str)
+    habit_created = Signal(bool, str)
     habit_deleted = Signal(bool, str)
+    search_done = Signal(dict)
+    auth_failed = Signal()
     error_occurred = Signal(str)
 
-    def __init__(self, api_base):
+    def __init__(self, api_base, profiler=None, token=None):
         super().__init__()
         self.api_base = api_base
+        self.profiler = profiler or RequestProfiler()
+        self.token = token
         self.action = None
         self.data = None
 
@@ -32,46 +182,92 @@ class ApiWorker(QThread):
         self.action = "load_analytics"
         self.start()
 
-    def save_completion(self, tracking_data):
-        self.action = "save_completion"
-        self.data = tracking_data
+    def search(self, params):
+        self.action = "search"
+        self.data = params
         self.start()
 
-    def delete_habit(self, habit_id):
-        self.action = "delete_habit"
-        self.data = habit_id
-        self.start()
+    def send(self, method, path, idempotent=False, **kwargs):
+        import requests
+        request_id = uuid.uuid4().hex[:16]
+        headers = kwargs.pop("headers", {})
+        headers["X-Request-ID"] = request_id
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if idempotent:
+            # Один ключ на все попытки: сервер вернёт исходный ответ, не повторяя запись
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+
+        for attempt in range(MAX_RETRIES + 1):
+            delay = RETRY_BACKOFF * 2 ** attempt
+            started = time.perf_counter()
+            try:
+                r = requests.request(method, f"{self.api_base}{path}", headers=headers, timeout=5, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.profiler.record("request", self.action, (time.perf_counter() - started) * 1000,
+                                     request_id=request_id, attempt=attempt, error=type(e).__name__)
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                self.profiler.record("request", self.action, (time.perf_counter() - started) * 1000,
+                                     request_id=request_id, attempt=attempt, status=r.status_code,
+                                     bytes=len(r.content), server_timing=r.headers.get("Server-Timing"))
+                if r.status_code == 401:
+                    self.auth_failed.emit()
+                # 409 — запрос с тем же Idempotency-Key ещё выполняется на сервере
+                if r.status_code not in (409, 429, 503) or attempt == MAX_RETRIES:
+                    return r
+                retry_after = r.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = int(retry_after)
+            time.sleep(delay)
 
     def run(self):
+        # requests грузится в фоновом потоке, а не при старте окна
+        import requests
         try:
             if self.action == "load_habits":
-                r = requests.get(f"{self.api_base}/habits/", timeout=5)
+                r = self.send("GET", "/habits/")
                 if r.status_code == 200:
                     self.habits_loaded.emit(r.json())
                 else:
                     self.error_occurred.emit("Ошибка загрузки привычек")
 
             elif self.action == "load_analytics":
-                r = requests.get(f"{self.api_base}/analytics/", timeout=5)
+                r = self.send("GET", "/analytics/")
                 if r.status_code == 200:
                     self.analytics_loaded.emit(r.json())
                 else:
                     self.error_occurred.emit("Ошибка загрузки аналитики")
 
+            elif self.action == "create_habit":
+                r = self.send("POST", "/habits/", idempotent=True, json=self.data)
+                if r.status_code == 200:
+                    self.habit_created.emit(True, "Привычка добавлена")
+                else:
+                    self.habit_created.emit(False, "Ошибка добавления")
+
             elif self.action == "save_completion":
-                r = requests.post(f"{self.api_base}/habits/complete/", json=self.data, timeout=5)
+                r = self.send("POST", "/habits/complete/", idempotent=True, json=self.data)
                 if r.status_code == 200:
                     self.completion_saved.emit(True, "Отметка сохранена")
                 else:
                     self.completion_saved.emit(False, "Ошибка сохранения")
 
             elif self.action == "delete_habit":
-                r = requests.delete(f"{self.api_base}/habits/{self.data}", timeout=5)
+                r = self.send("DELETE", f"/habits/{self.data}")
                 if r.status_code == 200:
                     self.habit_deleted.emit(True, "Привычка удалена")
                 else:
                     self.habit_deleted.emit(False, "Ошибка удаления")
 
+            elif self.action == "search":
+                r = self.send("GET", "/search/", params=self.data)
+                if r.status_code == 200:
+                    self.search_done.emit(r.json())
+                else:
+                    self.error_occurred.emit("Ошибка поиска")
+
         except requests.exceptions.ConnectionError:
             self.error_occurred.emit("Сервер не доступен")
         except requests.exceptions.Timeout:
@@ -81,23 +277,55 @@ class ApiWorker(QThread):
 
 
 class HabitTrackerDesktop(QMainWindow):
-    def __init__(self):
+    def __init__(self, token=None):
         super().__init__()
-        self.api_base = 'http://localhost:8000'
+        self.api_base = API_BASE
+        self.token = token
+        self.cache_path = CACHE_PATH.format(token.split(".")[0] if token else "anonymous")
         self.habits = []
         self.data_cache = {}
         self.last_update = 0
         self.cache_timeout = 30
+        self.profiler = RequestProfiler(enabled=os.environ.get("HABIT_TRACKER_PROFILE") == "1")
 
-        self.api_worker = ApiWorker(self.api_base)
+        self.api_worker = ApiWorker(self.api_base, self.profiler, token)
+        self.api_worker.auth_failed.connect(self.on_auth_failed)
         self.api_worker.habits_loaded.connect(self.on_habits_loaded)
         self.api_worker.analytics_loaded.connect(self.on_analytics_loaded)
-        self.api_worker.completion_saved.connect(self.on_completion_saved)
-        self.api_worker.habit_deleted.connect(self.on_habit_deleted)
         self.api_worker.error_occurred.connect(self.on_api_error)
+        self.api_worker.finished.connect(self.on_api_finished)
+        # Загрузка, запрошенная пока поток занят, выполняется после него
+        self.reload_pending = False
+
+        # Записи выполняются своим потоком по очереди, чтобы ни одна не потерялась
+        # из-за фоновой загрузки или повторов предыдущей записи
+        self.write_queue = deque()
+        self.write_worker = ApiWorker(self.api_base, self.profiler, token)
+        self.write_worker.auth_failed.connect(self.on_auth_failed)
+        self.write_worker.habit_created.connect(self.on_habit_added)
+        self.write_worker.completion_saved.connect(self.on_completion_saved)
+        self.write_worker.habit_deleted.connect(self.on_habit_deleted)
+        self.write_worker.error_occurred.connect(self.on_api_error)
+        self.write_worker.finished.connect(self.on_write_finished)
+
+        self.search_worker = ApiWorker(self.api_base, self.profiler, token)
+        self.search_worker.auth_failed.connect(self.on_auth_failed)
+        self.search_worker.search_done.connect(self.on_search_done)
+        self.search_worker.error_occurred.connect(self.on_api_error)
+
+        # Запрос уходит через 300 мс после последнего нажатия
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(300)
+        self.search_timer.timeout.connect(self.run_search)
+        self.sent_search_query = None
+
+        self.startup_bench = os.environ.get("HABIT_TRACKER_STARTUP_BENCH")
 
         self.init_ui()
-        self.load_habits()
+        self.load_cached_snapshot()
+        if self.startup_bench is None:
+            QTimer.singleShot(0, self.load_habits)
 
     def init_ui(self):
         self.setWindowTitle("Трекер Вредных Привычек")
@@ -230,19 +458,83 @@ class HabitTrackerDesktop(QMainWindow):
         self.tabs = QTabWidget()
         layout.addWidget(self.tabs)
 
-        self.create_habits_tab()
-        self.create_add_tab()
-        self.create_tracking_tab()
-        self.create_analytics_tab()
+        # Вкладки строятся при первом открытии, сразу только видимая
+        self.tab_builders = [
+            ("Привычки", self.create_habits_tab),
+            ("Добавить", self.create_add_tab),
+            ("Отслеживание", self.create_tracking_tab),
+            ("Аналитика", self.create_analytics_tab),
+        ]
+        self.built_tabs = set()
+        for title, _ in self.tab_builders:
+            self.tabs.addTab(QWidget(), title)
+        self.build_tab(0)
+        self.tabs.currentChanged.connect(self.build_tab)
 
         self.status_bar = self.statusBar()
         self.status_bar.showMessage("Готов к работе")
 
+        if self.profiler.enabled:
+            debug_btn = QPushButton("Отладка")
+            debug_btn.clicked.connect(self.show_profiler)
+            self.status_bar.addPermanentWidget(debug_btn)
+
 
         self.timer = QTimer()
         self.timer.timeout.connect(self.auto_refresh)
         self.timer.start(60000)
 
+    def build_tab(self, index):
+        if index in self.built_tabs or index < 0:
+            return
+        self.built_tabs.add(index)
+        self.tab_builders[index][1](self.tabs.widget(index))
+        if index == 2:
+            self.update_tracking_combo()
+
+    def load_cached_snapshot(self):
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                self.habits = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.data_cache['habits'] = self.habits
+        self.update_habits_list()
+        self.status_bar.showMessage(f"Показаны сохранённые данные: {len(self.habits)} привычек")
+
+    def save_cached_snapshot(self):
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump(self.habits, f, ensure_ascii=False)
+        except OSError:
+            pass
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.startup_bench is not None:
+            started = float(self.startup_bench)
+            self.startup_bench = None
+            print(f"startup_ms={(time.time() - started) * 1000:.1f}", flush=True)
+            QTimer.singleShot(0, QApplication.quit)
+
+    def queue_write(self, action, data):
+        self.write_queue.append((action, data))
+        self.start_next_write()
+
+    def start_next_write(self):
+        if self.write_worker.isRunning() or not self.write_queue:
+            return
+        self.write_worker.action, self.write_worker.data = self.write_queue.popleft()
+        self.write_worker.start()
+
+    def on_write_finished(self):
+        # finished приходит, пока поток ещё завершается; дожидаемся, чтобы start() сработал
+        self.write_worker.wait()
+        self.start_next_write()
+
+    def show_profiler(self):
+        ProfilerDialog(self.profiler, self).exec()
+
     def auto_refresh(self):
         current_time = time.time()
         if current_time - self.last_update > self.cache_timeout:
@@ -250,17 +542,32 @@ class HabitTrackerDesktop(QMainWindow):
 
     def load_habits(self):
         if self.api_worker.isRunning():
+            self.reload_pending = True
             return
 
         self.status_bar.showMessage("Загрузка...")
         self.api_worker.load_habits()
 
+    def on_api_finished(self):
+        # finished приходит, пока поток ещё завершается; дожидаемся, чтобы start() сработал
+        self.api_worker.wait()
+        if self.reload_pending:
+            self.reload_pending = False
+            self.load_habits()
+
     def on_habits_loaded(self, habits):
+        # Загрузка могла начаться до записи: показываем только ответ повторной загрузки
+        if self.reload_pending:
+            return
         self.habits = habits
         self.data_cache['habits'] = habits
         self.last_update = time.time()
-        self.update_habits_list()
+        if self.search_input.text().strip():
+            self.run_search()
+        else:
+            self.update_habits_list()
         self.update_tracking_combo()
+        self.save_cached_snapshot()
         self.status_bar.showMessage(f"Загружено {len(self.habits)} привычек")
 
     def on_analytics_loaded(self, analytics):
@@ -281,20 +588,56 @@ class HabitTrackerDesktop(QMainWindow):
         else:
             QMessageBox.critical(self, "Ошибка", message)
 
+    def on_auth_failed(self):
+        if self.token is None:
+            return
+        self.token = None
+        try:
+            os.remove(TOKEN_PATH)
+        except OSError:
+            pass
+        QMessageBox.warning(self, "Ошибка", "Сессия истекла. Перезапустите приложение и войдите снова")
+        self.close()
+
     def on_api_error(self, error_message):
         self.status_bar.showMessage(error_message)
         # Показываем ошибку только если она критическая
         if "Сервер не доступен" in error_message or "Таймаут" in error_message:
             QMessageBox.warning(self, "Ошибка", error_message)
 
-    def update_habits_list(self):
-        self.habits_list.clear()
-        for habit in self.habits:
-            item = QListWidgetItem(habit['name'])
-            item.setData(Qt.UserRole, habit)
-            self.habits_list.addItem(item)
+    def run_search(self):
+        query = self.search_input.text().strip()
+        if not query:
+            self.update_habits_list()
+            return
+        if self.search_worker.isRunning():
+            self.search_timer.start()
+            return
+        self.sent_search_query = query
+        self.search_worker.search({"q": query})
+
+    def on_search_done(self, results):
+        # Ответ на запрос, который пользователь уже успел изменить, не показываем
+        if self.search_input.text().strip() != self.sent_search_query:
+            return
+        self.update_habits_list(results['habits'])
+        self.status_bar.showMessage(
+            f"Найдено привычек: {len(results['habits'])}, заметок: {len(results['notes'])}"
+        )
+
+    def update_habits_list(self, habits=None):
+        if habits is None:
+            habits = self.habits
+        with self.profiler.render("update_habits_list"):
+            self.habits_list.clear()
+            for habit in habits:
+                item = QListWidgetItem(habit['name'])
+                item.setData(Qt.UserRole, habit)
+                self.habits_list.addItem(item)
 
     def update_tracking_combo(self):
+        if 2 not in self.built_tabs:
+            return
         self.track_habit_combo.clear()
         for habit in self.habits:
             self.track_habit_combo.addItem(habit['name'], habit['id'])
@@ -339,12 +682,7 @@ class HabitTrackerDesktop(QMainWindow):
 
         self.status_bar.showMessage("Добавление привычки...")
 
-        worker = ApiWorker(self.api_base)
-        worker.completion_saved.connect(self.on_habit_added)
-        worker.error_occurred.connect(self.on_api_error)
-        worker.action = "save_completion"
-        worker.data = habit_data
-        worker.start()
+        self.queue_write("create_habit", habit_data)
 
     def on_habit_added(self, success, message):
         if success:
@@ -370,7 +708,7 @@ class HabitTrackerDesktop(QMainWindow):
             QMessageBox.Yes | QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            self.api_worker.delete_habit(habit['id'])
+            self.queue_write("delete_habit", habit['id'])
 
     def show_tracking_dialog(self):
         current_item = self.habits_list.currentItem()
@@ -393,7 +731,7 @@ class HabitTrackerDesktop(QMainWindow):
             "craving_level": self.craving_slider.value(),
             "resistance_level": self.resistance_slider.value()
         }
-        self.api_worker.save_completion(tracking_data)
+        self.queue_write("save_completion", tracking_data)
 
     def load_analytics(self):
         if self.api_worker.isRunning():
@@ -403,27 +741,27 @@ class HabitTrackerDesktop(QMainWindow):
         self.api_worker.load_analytics()
 
     def display_analytics(self, analytics):
-        total_habits = analytics['total_stats']['total_habits']
-        stats_text = f"<b>Общая статистика</b><br>Всего привычек: {total_habits}"
-        self.stats_label.setText(stats_text)
-
-        for i in reversed(range(self.progress_layout.count())):
-            widget = self.progress_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
-
-        for stat in analytics['habit_stats']:
-            group = QGroupBox(stat['habit_name'])
-            layout = QVBoxLayout()
-            progress = QProgressBar()
-            progress.setValue(int(stat['completion_rate']))
-            progress.setFormat(f"{stat['completion_rate']}% ({stat['completed_count']}/30 дней)")
-            layout.addWidget(progress)
-            group.setLayout(layout)
-            self.progress_layout.addWidget(group)
-
-    def create_habits_tab(self):
-        tab = QWidget()
+        with self.profiler.render("display_analytics"):
+            total_habits = analytics['total_stats']['total_habits']
+            stats_text = f"<b>Общая статистика</b><br>Всего привычек: {total_habits}"
+            self.stats_label.setText(stats_text)
+
+            for i in reversed(range(self.progress_layout.count())):
+                widget = self.progress_layout.itemAt(i).widget()
+                if widget:
+                    widget.setParent(None)
+
+            for stat in analytics['habit_stats']:
+                group = QGroupBox(stat['habit_name'])
+                layout = QVBoxLayout()
+                progress = QProgressBar()
+                progress.setValue(int(stat['completion_rate']))
+                progress.setFormat(f"{stat['completion_rate']}% ({stat['completed_count']}/30 дней)")
+                layout.addWidget(progress)
+                group.setLayout(layout)
+                self.progress_layout.addWidget(group)
+
+    def create_habits_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
@@ -435,6 +773,11 @@ class HabitTrackerDesktop(QMainWindow):
         header_layout.addStretch()
         layout.addLayout(header_layout)
 
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск по привычкам, мотивации и заметкам...")
+        self.search_input.textChanged.connect(lambda _: self.search_timer.start())
+        layout.addWidget(self.search_input)
+
         self.habits_list = QListWidget()
         self.habits_list.itemClicked.connect(self.on_habit_selected)
         layout.addWidget(self.habits_list)
@@ -453,10 +796,7 @@ class HabitTrackerDesktop(QMainWindow):
         actions_layout.addWidget(track_btn)
         layout.addLayout(actions_layout)
 
-        self.tabs.addTab(tab, "Привычки")
-
-    def create_add_tab(self):
-        tab = QWidget()
+    def create_add_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
@@ -490,10 +830,8 @@ class HabitTrackerDesktop(QMainWindow):
         layout.addWidget(add_btn)
 
         layout.addStretch()
-        self.tabs.addTab(tab, "Добавить")
 
-    def create_tracking_tab(self):
-        tab = QWidget()
+    def create_tracking_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
@@ -544,10 +882,8 @@ class HabitTrackerDesktop(QMainWindow):
         layout.addWidget(save_btn)
 
         layout.addStretch()
-        self.tabs.addTab(tab, "Отслеживание")
 
-    def create_analytics_tab(self):
-        tab = QWidget()
+    def create_analytics_tab(self, tab):
         layout = QVBoxLayout(tab)
         layout.setSpacing(10)
 
@@ -577,11 +913,26 @@ class HabitTrackerDesktop(QMainWindow):
         layout.addWidget(refresh_btn)
 
         layout.addStretch()
-        self.tabs.addTab(tab, "Аналитика")
+
+
+def load_token():
+    try:
+        with open(TOKEN_PATH, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = HabitTrackerDesktop()
+    token = load_token()
+    if token is None and "HABIT_TRACKER_STARTUP_BENCH" not in os.environ:
+        dialog = LoginDialog(API_BASE)
+        if dialog.exec() != QDialog.Accepted:
+            sys.exit(0)
+        token = dialog.token
+        with open(TOKEN_PATH, "w", encoding="utf-8") as f:
+            f.write(token)
+    window = HabitTrackerDesktop(token)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -1,27 +1,266 @@
+// Кеш ответов API: сразу отдаёт сохранённые данные и обновляет их в фоне
+class DataStore {
+    constructor(fetcher, maxAge = 30000) {
+        this.fetcher = fetcher;
+        this.maxAge = maxAge;
+        this.scope = '';
+        this.cache = new Map();
+        this.inflight = new Map();
+        // Растёт при каждой записи: ответы, начатые раньше, считаются устаревшими
+        this.generation = 0;
+        this.stats = { requests: 0, cacheHits: 0, deduped: 0, revalidations: 0 };
+        this.ready = this.hydrate();
+    }
+
+    openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open('habit-tracker', 1);
+            request.onupgradeneeded = () => request.result.createObjectStore('responses');
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async hydrate() {
+        if (!window.indexedDB) return;
+        try {
+            this.db = await this.openDb();
+            const store = this.db.transaction('responses').objectStore('responses');
+            await new Promise((resolve, reject) => {
+                const request = store.openCursor();
+                request.onsuccess = () => {
+                    const cursor = request.result;
+                    if (!cursor) return resolve();
+                    // Данные из прошлой сессии показываем, но сразу перепроверяем
+                    this.cache.set(cursor.key, { data: cursor.value, fetchedAt: 0 });
+                    cursor.continue();
+                };
+                request.onerror = () => reject(request.error);
+            });
+        } catch (error) {
+            console.error('IndexedDB unavailable:', error);
+            this.db = null;
+        }
+    }
+
+    // Ключи кеша включают пользователя, чтобы данные разных учётных записей не смешивались
+    setScope(scope) {
+        this.scope = scope;
+    }
+
+    key(path) {
+        return `${this.scope}:${path}`;
+    }
+
+    persist(key, data) {
+        if (!this.db) return;
+        try {
+            this.db.transaction('responses', 'readwrite').objectStore('responses').put(data, key);
+        } catch (error) {
+            console.error('Error persisting cache:', error);
+        }
+    }
+
+    peek(path) {
+        const entry = this.cache.get(this.key(path));
+        return entry ? entry.data : undefined;
+    }
+
+    fetch(path) {
+        const key = this.key(path);
+        // Параллельные запросы одного и того же пути используют один fetch
+        if (this.inflight.has(key)) {
+            this.stats.deduped++;
+            return this.inflight.get(key);
+        }
+
+        this.stats.requests++;
+        const generation = this.generation;
+        const promise = this.fetcher(path)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(data => {
+                if (generation !== this.generation) {
+                    // Запрос начат до записи и мог вернуть старые данные: запрашиваем заново
+                    return this.fetch(path);
+                }
+                this.cache.set(key, { data, fetchedAt: Date.now() });
+                this.persist(key, data);
+                return data;
+            })
+            .finally(() => {
+                if (this.inflight.get(key) === promise) {
+                    this.inflight.delete(key);
+                }
+            });
+
+        this.inflight.set(key, promise);
+        return promise;
+    }
+
+    async read(path, onData) {
+        await this.ready;
+        const entry = this.cache.get(this.key(path));
+        if (entry) {
+            this.stats.cacheHits++;
+            onData(entry.data);
+            if (Date.now() - entry.fetchedAt < this.maxAge) {
+                return;
+            }
+            this.stats.revalidations++;
+        }
+
+        const data = await this.fetch(path);
+        // Перерисовываем только если данные действительно изменились
+        if (!entry || JSON.stringify(entry.data) !== JSON.stringify(data)) {
+            onData(data);
+        }
+    }
+
+    invalidate() {
+        this.generation++;
+        this.inflight.clear();
+        this.cache.forEach(entry => { entry.fetchedAt = 0; });
+    }
+
+    // При выходе стираем ответы из памяти и IndexedDB: в общем браузере их не должен увидеть следующий пользователь
+    async clear() {
+        this.generation++;
+        this.inflight.clear();
+        this.cache.clear();
+        await this.ready;
+        this.cache.clear();
+        if (!this.db) return;
+        try {
+            this.db.transaction('responses', 'readwrite').objectStore('responses').clear();
+        } catch (error) {
+            console.error('Error clearing cache:', error);
+        }
+    }
+}
+
 class BadHabitTracker {
     constructor() {
         this.apiBase = 'http://localhost:8000';
+        this.token = localStorage.getItem('habitTrackerToken');
+        this.store = new DataStore(path => this.apiFetch(path));
+        if (this.token) {
+            this.store.setScope(this.token.split('.')[0]);
+        }
         this.currentTab = 'habits';
         this.chart = null;
+        this.searchTimer = null;
+        this.searchSeq = 0;
         this.init();
     }
 
     init() {
         this.setupEventListeners();
-        this.showTab('habits');
-        this.loadHabits();
         this.setDefaultDate();
         this.setupRangeSliders();
+        if (!this.token) {
+            this.showLogin();
+            return;
+        }
+        this.showTab('habits');
+        this.loadHabits();
+    }
+
+    async apiFetch(path, options = {}) {
+        const headers = { ...(options.headers || {}) };
+        if (this.token) {
+            headers['Authorization'] = `Bearer ${this.token}`;
+        }
+        const response = await fetch(`${this.apiBase}${path}`, { ...options, headers });
+        if (response.status === 401) {
+            this.logout();
+        }
+        return response;
+    }
+
+    showLogin() {
+        document.getElementById('login-modal').style.display = 'block';
+        document.getElementById('login-username').focus();
+    }
+
+    async authenticate(path) {
+        const username = document.getElementById('login-username').value.trim();
+        const password = document.getElementById('login-password').value;
+        if (!username || !password) {
+            this.showError('Введите имя пользователя и пароль');
+            return;
+        }
+
+        try {
+            const response = await fetch(`${this.apiBase}${path}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ username, password })
+            });
+
+            if (response.status === 409) {
+                throw new Error('Имя пользователя уже занято');
+            }
+            if (response.status === 401) {
+                throw new Error('Неверное имя пользователя или пароль');
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+
+            const user = await response.json();
+            this.token = user.token;
+            localStorage.setItem('habitTrackerToken', user.token);
+            this.store.setScope(String(user.id));
+            document.getElementById('login-form').reset();
+            document.getElementById('login-modal').style.display = 'none';
+            this.showTab('habits');
+        } catch (error) {
+            console.error('Error authenticating:', error);
+            this.showError('Ошибка входа: ' + error.message);
+        }
+    }
+
+    logout() {
+        if (!this.token) return;
+        // Отзываем токен на сервере; после 401 запрос просто получит тот же ответ
+        fetch(`${this.apiBase}/users/logout/`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${this.token}` }
+        }).catch(error => console.error('Error logging out:', error));
+        this.token = null;
+        localStorage.removeItem('habitTrackerToken');
+        this.store.setScope('');
+        this.store.clear();
+        this.renderHabits([]);
+        this.showLogin();
     }
 
     setupEventListeners() {
-        document.querySelectorAll('.nav-btn').forEach(btn => {
+        document.querySelectorAll('.nav-btn[data-tab]').forEach(btn => {
             btn.addEventListener('click', (e) => {
                 const tab = e.target.getAttribute('data-tab');
                 this.showTab(tab);
             });
         });
 
+        document.getElementById('logout-btn').addEventListener('click', () => this.logout());
+
+        document.getElementById('login-form').addEventListener('submit', (e) => {
+            e.preventDefault();
+            this.authenticate('/users/login/');
+        });
+
+        document.getElementById('register-btn').addEventListener('click', () => {
+            this.authenticate('/users/register/');
+        });
+
         document.getElementById('habit-form').addEventListener('submit', (e) => {
             e.preventDefault();
             this.addHabit();
@@ -43,6 +282,11 @@ class BadHabitTracker {
             }
         });
 
+        // Поиск с задержкой, чтобы не отправлять запрос на каждое нажатие
+        document.getElementById('habit-search').addEventListener('input', () => this.scheduleSearch());
+        document.getElementById('search-difficulty').addEventListener('change', () => this.scheduleSearch());
+        document.getElementById('search-frequency').addEventListener('change', () => this.scheduleSearch());
+
         // Закрытие модального окна по ESC
         document.addEventListener('keydown', (e) => {
             if (e.key === 'Escape') {
@@ -91,19 +335,83 @@ class BadHabitTracker {
         }
     }
 
-    async loadHabits() {
+    scheduleSearch() {
+        clearTimeout(this.searchTimer);
+        this.searchTimer = setTimeout(() => this.loadHabits(), 300);
+    }
+
+    getSearchParams() {
+        const params = new URLSearchParams();
+        const q = document.getElementById('habit-search').value.trim();
+        const difficulty = document.getElementById('search-difficulty').value;
+        const frequency = document.getElementById('search-frequency').value;
+        if (q) params.set('q', q);
+        if (difficulty) params.set('difficulty', difficulty);
+        if (frequency) params.set('frequency', frequency);
+        return params;
+    }
+
+    async searchHabits(params) {
+        const seq = ++this.searchSeq;
         try {
-            this.showLoading('habits-list', 'Загрузка привычек...');
-            const response = await fetch(`${this.apiBase}/habits/`);
+            const response = await this.apiFetch(`/search/?${params}`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            const habits = await response.json();
-            this.renderHabits(habits);
+            const results = await response.json();
+            // Ответ на устаревший запрос не должен перезаписать более свежий
+            if (seq !== this.searchSeq) return;
+            this.renderHabits(results.habits);
+            this.renderNoteMatches(results.notes);
+        } catch (error) {
+            console.error('Error searching habits:', error);
+            this.showError('Ошибка поиска');
+        }
+    }
+
+    renderNoteMatches(notes) {
+        const container = document.getElementById('search-notes');
+        if (!notes || notes.length === 0) {
+            container.innerHTML = '';
+            return;
+        }
+
+        container.innerHTML = `
+            <h3>Найдено в заметках</h3>
+            ${notes.map(note => `
+                <div class="note-match">
+                    <strong>${this.escapeHtml(note.habit_name)}</strong>, ${note.completion_date}
+                    <p>${this.escapeHtml(note.notes)}</p>
+                </div>
+            `).join('')}
+        `;
+    }
+
+    async loadHabits() {
+        const searchParams = this.getSearchParams();
+        if (searchParams.toString()) {
+            return this.searchHabits(searchParams);
+        }
+        this.searchSeq++;
+        this.renderNoteMatches([]);
+
+        const cached = this.store.peek('/habits/');
+        try {
+            if (cached === undefined) {
+                this.showLoading('habits-list', 'Загрузка привычек...');
+            }
+            await this.store.read('/habits/', habits => {
+                // Фоновое обновление не должно затереть результаты поиска
+                if (!this.getSearchParams().toString()) {
+                    this.renderHabits(habits);
+                }
+            });
         } catch (error) {
             console.error('Error loading habits:', error);
             this.showError('Ошибка загрузки привычек');
-            this.renderHabits([]);
+            if (cached === undefined) {
+                this.renderHabits([]);
+            }
         }
     }
 
@@ -209,15 +517,10 @@ class BadHabitTracker {
         };
 
         try {
-            const response = await fetch(`${this.apiBase}/habits/`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(formData)
-            });
+            const response = await this.postWithRetry('/habits/', formData);
 
             if (response.ok) {
+                this.store.invalidate();
                 this.showSuccess('Вредная привычка добавлена для отслеживания!');
                 document.getElementById('habit-form').reset();
                 this.showTab('habits');
@@ -232,17 +535,60 @@ class BadHabitTracker {
         }
     }
 
+    async postWithRetry(path, data, retries = 3, timeout = 5000) {
+        // Один ключ на все попытки: повтор после таймаута не создаст дубликат
+        const idempotencyKey = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+
+        for (let attempt = 0; ; attempt++) {
+            let delay = 500 * 2 ** attempt;
+            // У fetch нет своего таймаута: зависшая попытка прерывается и повторяется
+            const controller = new AbortController();
+            const timer = setTimeout(() => controller.abort(), timeout);
+            try {
+                const response = await this.apiFetch(path, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Idempotency-Key': idempotencyKey
+                    },
+                    body: JSON.stringify(data),
+                    signal: controller.signal
+                });
+
+                // 409 — запрос с тем же ключом ещё выполняется на сервере
+                const retryable = [409, 429, 503].includes(response.status);
+                if (!retryable || attempt >= retries) {
+                    return response;
+                }
+                const retryAfter = parseInt(response.headers.get('Retry-After'));
+                if (retryAfter) {
+                    delay = retryAfter * 1000;
+                }
+            } catch (error) {
+                if (attempt >= retries) {
+                    throw error.name === 'AbortError' ? new Error('Таймаут соединения') : error;
+                }
+            } finally {
+                clearTimeout(timer);
+            }
+            await new Promise(resolve => setTimeout(resolve, delay));
+        }
+    }
+
     async deleteHabit(habitId) {
         if (!confirm('Вы уверены, что хотите удалить эту привычку из отслеживания?')) {
             return;
         }
 
         try {
-            const response = await fetch(`${this.apiBase}/habits/${habitId}`, {
+            const response = await this.apiFetch(`/habits/${habitId}`, {
                 method: 'DELETE'
             });
 
             if (response.ok) {
+                this.store.invalidate();
                 this.showSuccess('Привычка удалена из отслеживания!');
                 await this.loadHabits();
             } else {
@@ -313,15 +659,10 @@ class BadHabitTracker {
         }
 
         try {
-            const response = await fetch(`${this.apiBase}/habits/complete/`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(formData)
-            });
+            const response = await this.postWithRetry('/habits/complete/', formData);
 
             if (response.ok) {
+                this.store.invalidate();
                 this.showSuccess('Данные о дне борьбы сохранены!');
                 this.closeModal();
                 await this.loadHabits();
@@ -341,18 +682,18 @@ class BadHabitTracker {
     }
 
     async loadAnalytics() {
+        const cached = this.store.peek('/analytics/');
         try {
-            this.showLoading('stats-grid', 'Загрузка аналитики...');
-            const response = await fetch(`${this.apiBase}/analytics/`);
-            if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+            if (cached === undefined) {
+                this.showLoading('stats-grid', 'Загрузка аналитики...');
             }
-            const analytics = await response.json();
-            this.renderAnalytics(analytics);
+            await this.store.read('/analytics/', analytics => this.renderAnalytics(analytics));
         } catch (error) {
             console.error('Error loading analytics:', error);
             this.showError('Ошибка загрузки аналитики');
-            this.renderAnalytics({ total_stats: {}, habit_stats: [] });
+            if (cached === undefined) {
+                this.renderAnalytics({ total_stats: {}, habit_stats: [] });
+            }
         }
     }
 
@@ -410,12 +751,15 @@ class BadHabitTracker {
 
         if (this.chart) {
             this.chart.destroy();
+            this.chart = null;
         }
+        ctx.parentNode.querySelectorAll('.chart-no-data').forEach(el => el.remove());
 
         // Если нет данных для графика
         if (!habitStats || habitStats.length === 0) {
             ctx.getContext('2d').clearRect(0, 0, ctx.width, ctx.height);
             const noDataText = document.createElement('div');
+            noDataText.className = 'chart-no-data';
             noDataText.style.textAlign = 'center';
             noDataText.style.padding = '40px';
             noDataText.style.color = '#6c757d';
@@ -499,7 +843,7 @@ class BadHabitTracker {
 
     async viewCompletions(habitId) {
         try {
-            const response = await fetch(`${this.apiBase}/habits/${habitId}/completions/`);
+            const response = await this.apiFetch(`/habits/${habitId}/completions/`);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
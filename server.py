@@ -1,13 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import os
+import math
+import time
+import asyncio
+import threading
+import uuid
+import json
+import hashlib
+import hmac
+import secrets
+import re
+import sys
+import bisect
+import heapq
+from collections import OrderedDict
 
 app = FastAPI(
     title="Habit Tracker API",
@@ -15,12 +29,610 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Ограничение нагрузки на БД
+RATE_LIMIT_PER_SECOND = 5.0
+RATE_LIMIT_BURST = 20
+RATE_LIMIT_MAX_CLIENTS = 10000
+DB_MAX_CONCURRENCY = 10
+# Одно соединение сверх лимита запросов — для фоновой очистки
+DB_POOL_SIZE = DB_MAX_CONCURRENCY + 1
+ADMISSION_MAX_QUEUE = 50
+ADMISSION_MAX_QUEUE_WAIT = 2.0
+UNLIMITED_PATHS = {"/", "/style.css", "/script.js", "/health", "/metrics/"}
+
+# Фоновая очистка удалённых привычек
+PURGE_BATCH_SIZE = 500
+PURGE_INTERVAL = 60
+
+# Повторы записей по Idempotency-Key
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_MAX_KEYS = 100000
+
+# Поиск
+SEARCH_MAX_LIMIT = 100
+# Около 600 МБ на миллион заметок
+SEARCH_INDEX_MAX_DOCS = 2000000
+
+# Пользователи
+AUTH_SECRET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".habit_tracker_secret")
+TOKEN_TTL = 30 * 24 * 60 * 60
+# Сколько секунд версия токена берётся из памяти: настолько запаздывает отзыв в других процессах
+TOKEN_VERSION_TTL = 60
+TOKEN_VERSION_MAX_USERS = 100000
+PASSWORD_ITERATIONS = 100000
+
+SCHEMA_COLUMNS = [
+    ("habits", "deleted_at", "ALTER TABLE habits ADD COLUMN deleted_at DATETIME NULL DEFAULT NULL"),
+    ("habits", "user_id", "ALTER TABLE habits ADD COLUMN user_id INT NULL"),
+    ("habit_completions", "user_id", "ALTER TABLE habit_completions ADD COLUMN user_id INT NULL"),
+    # Увеличивается при выходе, чтобы отозвать все выданные пользователю токены
+    ("users", "token_version", "ALTER TABLE users ADD COLUMN token_version INT NOT NULL DEFAULT 0"),
+]
+
+SCHEMA_INDEXES = [
+    # Нужен фоновой очистке: запрос deleted_at IS NOT NULL идёт по всем пользователям,
+    # и индекс с user_id во главе его не обслуживает
+    ("habits", "idx_habits_deleted_created",
+     "CREATE INDEX idx_habits_deleted_created ON habits (deleted_at, created_at)"),
+    ("habits", "idx_habits_user_deleted_created",
+     "CREATE INDEX idx_habits_user_deleted_created ON habits (user_id, deleted_at, created_at)"),
+    ("habit_completions", "idx_habit_completions_user_habit_date",
+     "CREATE INDEX idx_habit_completions_user_habit_date ON habit_completions (user_id, habit_id, completion_date)"),
+]
+
+# Поиск идёт по обратному индексу в памяти, а FULLTEXT-индексы только замедляли запись
+SCHEMA_DROPPED_INDEXES = [
+    ("habits", "ft_habits_text"),
+    ("habit_completions", "ft_habit_completions_notes"),
+]
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        # now мог быть взят раньше, чем создано ведро: отрицательный интервал не отнимает токены
+        if now <= self.updated:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, rate, capacity, max_clients):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        # Порядок ключей — порядок последнего обращения, первым вытесняется самый давний клиент
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, client):
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                if len(self.buckets) >= self.max_clients:
+                    self.buckets.popitem(last=False)
+                bucket = self.buckets[client] = TokenBucket(self.rate, self.capacity)
+            else:
+                self.buckets.move_to_end(client)
+            wait = bucket.take(now)
+            if wait:
+                self.rejected += 1
+            else:
+                self.allowed += 1
+            return wait
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "rate_per_second": self.rate,
+                "burst": self.capacity,
+            }
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency, max_queue, max_queue_wait):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.last_queue_wait = 0.0
+
+    def overloaded(self):
+        self.shed += 1
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server overloaded"},
+            headers={"Retry-After": str(math.ceil(self.max_queue_wait))}
+        )
+
+    async def run(self, request, call_next):
+        if self.waiting >= self.max_queue:
+            return self.overloaded()
+
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            return self.overloaded()
+        finally:
+            self.waiting -= 1
+            self.last_queue_wait = time.monotonic() - started
+
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            return await call_next(request)
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "last_queue_wait_ms": round(self.last_queue_wait * 1000, 1),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+class IdempotencyStore:
+    def __init__(self, ttl, max_keys):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # ключ -> [истекает, отпечаток запроса, ответ или None пока запрос выполняется]
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.replayed = 0
+
+    def fingerprint(self, payload):
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def expire(self, now):
+        while self.entries:
+            entry = next(iter(self.entries.values()))
+            if entry[0] > now:
+                break
+            self.entries.popitem(last=False)
+
+    def begin(self, key, payload):
+        if key is None:
+            return None
+        now = time.monotonic()
+        fingerprint = self.fingerprint(payload)
+        with self.lock:
+            self.expire(now)
+            entry = self.entries.get(key)
+            if entry is None:
+                # Место освобождается только под новый ключ, поиск повтора ничего не вытесняет
+                while len(self.entries) >= self.max_keys:
+                    self.entries.popitem(last=False)
+                self.entries[key] = [now + self.ttl, fingerprint, None]
+                return None
+            if entry[1] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key reused with a different request")
+            if entry[2] is None:
+                raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is in progress")
+            self.replayed += 1
+            return entry[2]
+
+    def finish(self, key, response):
+        if key is None:
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry[2] = response
+
+    def abort(self, key):
+        # Неуспешные запросы не запоминаются, их можно повторить с тем же ключом
+        if key is None:
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is None:
+                del self.entries[key]
+
+    def stats(self):
+        with self.lock:
+            return {"keys": len(self.entries), "replayed": self.replayed}
+
+
+def search_words(text):
+    # Слова приводятся к нижнему регистру и интернируются: у тяжёлого пользователя миллионы повторов
+    return [sys.intern(word) for word in re.findall(r"\w+", (text or "").lower())]
+
+
+class TenantSearchIndex:
+    # Обратный индекс одного пользователя. Тексты не хранятся: индекс возвращает id,
+    # а строки страницы дочитываются из БД по первичному ключу
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.words = []            # отсортированный словарь, по нему ищется префикс
+        self.habit_postings = {}   # слово -> {id привычки: вес}
+        self.note_postings = {}    # слово -> {id отметки}
+        self.habits = {}           # id -> (слова с весами, сложность, частота, created_at)
+        self.notes = {}            # id -> (слова, id привычки, дата)
+        self.notes_by_habit = {}   # id привычки -> {id отметки}
+
+    def size(self):
+        return len(self.habits) + len(self.notes)
+
+    def add_word(self, word):
+        if word not in self.habit_postings and word not in self.note_postings:
+            bisect.insort(self.words, word)
+
+    def drop_word(self, word):
+        if word not in self.habit_postings and word not in self.note_postings:
+            position = bisect.bisect_left(self.words, word)
+            if position < len(self.words) and self.words[position] == word:
+                del self.words[position]
+
+    def expand(self, prefix):
+        # Все слова словаря, начинающиеся с prefix
+        position = bisect.bisect_left(self.words, prefix)
+        while position < len(self.words) and self.words[position].startswith(prefix):
+            yield self.words[position]
+            position += 1
+
+    def put_habit(self, habit_id, name, description, motivation_text, difficulty_level, frequency, created_at):
+        self.remove_habit(habit_id, keep_notes=True)
+        # Совпадение в названии важнее, чем в описании или мотивации
+        weights = {}
+        for word in search_words(name):
+            weights[word] = weights.get(word, 0) + 3
+        for word in search_words(description) + search_words(motivation_text):
+            weights[word] = weights.get(word, 0) + 1
+        for word, weight in weights.items():
+            self.add_word(word)
+            self.habit_postings.setdefault(word, {})[habit_id] = weight
+        self.habits[habit_id] = (weights, difficulty_level, frequency, str(created_at))
+
+    def remove_habit(self, habit_id, keep_notes=False):
+        entry = self.habits.pop(habit_id, None)
+        if entry is not None:
+            for word in entry[0]:
+                postings = self.habit_postings[word]
+                del postings[habit_id]
+                if not postings:
+                    del self.habit_postings[word]
+                    self.drop_word(word)
+        if not keep_notes:
+            for note_id in list(self.notes_by_habit.get(habit_id, ())):
+                self.remove_note(note_id)
+
+    def put_note(self, note_id, habit_id, completion_date, notes):
+        self.remove_note(note_id)
+        words = tuple(set(search_words(notes)))
+        for word in words:
+            self.add_word(word)
+            self.note_postings.setdefault(word, set()).add(note_id)
+        self.notes[note_id] = (words, habit_id, sys.intern(str(completion_date)))
+        self.notes_by_habit.setdefault(habit_id, set()).add(note_id)
+
+    def remove_note(self, note_id):
+        entry = self.notes.pop(note_id, None)
+        if entry is None:
+            return
+        words, habit_id, _ = entry
+        for word in words:
+            postings = self.note_postings[word]
+            postings.discard(note_id)
+            if not postings:
+                del self.note_postings[word]
+                self.drop_word(word)
+        habit_notes = self.notes_by_habit[habit_id]
+        habit_notes.discard(note_id)
+        if not habit_notes:
+            del self.notes_by_habit[habit_id]
+
+    def habit_matches(self, habit_id, difficulty_level, frequency):
+        entry = self.habits.get(habit_id)
+        return (entry is not None
+                and (not difficulty_level or entry[1] == difficulty_level)
+                and (not frequency or entry[2] == frequency))
+
+    def search_habits(self, words, difficulty_level, frequency, limit, offset):
+        scores = None
+        for prefix in words:
+            matched = {}
+            for word in self.expand(prefix):
+                for habit_id, weight in self.habit_postings.get(word, {}).items():
+                    matched[habit_id] = max(matched.get(habit_id, 0), weight)
+            # Каждое слово запроса обязательно
+            if scores is None:
+                scores = matched
+            else:
+                scores = {habit_id: score + matched[habit_id] for habit_id, score in scores.items() if habit_id in matched}
+        candidates = [
+            habit_id for habit_id in scores or ()
+            if self.habit_matches(habit_id, difficulty_level, frequency)
+        ]
+        ranked = heapq.nlargest(offset + limit, candidates, key=lambda habit_id: (scores[habit_id], self.habits[habit_id][3]))
+        return ranked[offset:]
+
+    def search_notes(self, words, difficulty_level, frequency, limit, offset):
+        matched = []
+        for prefix in words:
+            ids = set()
+            for word in self.expand(prefix):
+                ids |= self.note_postings.get(word, set())
+            matched.append(ids)
+        if not matched:
+            return []
+        # Пересечение начинаем с самого короткого списка
+        matched.sort(key=len)
+        ids = matched[0].intersection(*matched[1:])
+        if difficulty_level or frequency:
+            ids = [note_id for note_id in ids if self.habit_matches(self.notes[note_id][1], difficulty_level, frequency)]
+        ranked = heapq.nlargest(offset + limit, ids, key=lambda note_id: (self.notes[note_id][2], note_id))
+        return ranked[offset:]
+
+
+class SearchIndex:
+    # Индексы пользователей строятся при первом поиске и обновляются обработчиками записи.
+    # Размер ограничен общим числом документов, первым вытесняется самый давний пользователь
+    def __init__(self, max_docs):
+        self.max_docs = max_docs
+        self.tenants = OrderedDict()
+        # id пользователя -> [число идущих построений, была ли запись во время построения]
+        self.building = {}
+        self.lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, user_id):
+        with self.lock:
+            tenant = self.tenants.get(user_id)
+            if tenant is not None:
+                self.tenants.move_to_end(user_id)
+            return tenant
+
+    def begin_build(self, user_id):
+        with self.lock:
+            self.building.setdefault(user_id, [0, False])[0] += 1
+
+    def finish_build(self, user_id, tenant):
+        with self.lock:
+            entry = self.building[user_id]
+            entry[0] -= 1
+            dirty = entry[1]
+            if entry[0] == 0:
+                del self.building[user_id]
+            # Снимок, во время чтения которого была запись, мог её пропустить: его не сохраняем
+            if tenant is None or dirty:
+                return
+            self.tenants[user_id] = tenant
+            self.tenants.move_to_end(user_id)
+            self.builds += 1
+            total = sum(indexed.size() for indexed in self.tenants.values())
+            while total > self.max_docs and len(self.tenants) > 1:
+                _, evicted = self.tenants.popitem(last=False)
+                total -= evicted.size()
+
+    def update(self, user_id, change):
+        # Вызывается после фиксации транзакции
+        with self.lock:
+            if user_id in self.building:
+                self.building[user_id][1] = True
+            tenant = self.tenants.get(user_id)
+        if tenant is not None:
+            with tenant.lock:
+                change(tenant)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "tenants": len(self.tenants),
+                "documents": sum(tenant.size() for tenant in self.tenants.values()),
+                "builds": self.builds,
+            }
+
+
+class TokenVersionCache:
+    # Версии токенов пользователей, чтобы не обращаться к БД на каждом запросе
+    def __init__(self, ttl, max_users):
+        self.ttl = ttl
+        self.max_users = max_users
+        # id пользователя -> [истекает, версия]
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id, version):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            # Версия только растёт: запоздавшее чтение старой версии не отменяет выход
+            if entry is not None and entry[0] > now and entry[1] > version:
+                version = entry[1]
+            self.entries[user_id] = [now + self.ttl, version]
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_users:
+                self.entries.popitem(last=False)
+            return version
+
+    def stats(self):
+        with self.lock:
+            return {"users": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+def hash_password(password):
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PASSWORD_ITERATIONS)
+    return f"{salt.hex()}${digest.hex()}"
+
+def verify_password(password, password_hash):
+    salt_hex, digest_hex = password_hash.split("$", 1)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt_hex), PASSWORD_ITERATIONS)
+    return hmac.compare_digest(digest.hex(), digest_hex)
+
+def load_auth_secret():
+    # Секрет из окружения, иначе случайный, созданный при первом запуске и сохранённый рядом с сервером
+    secret = os.environ.get("HABIT_TRACKER_SECRET")
+    if secret:
+        return secret
+    try:
+        with open(AUTH_SECRET_PATH, encoding="utf-8") as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    secret = secrets.token_hex(32)
+    fd = os.open(AUTH_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secret)
+    return secret
+
+AUTH_SECRET = load_auth_secret()
+
+TOKEN_PATTERN = re.compile(r"([0-9]+\.[0-9]+\.[0-9]+)\.([0-9a-f]{64})")
+
+def sign_token(payload):
+    return hmac.new(AUTH_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+def make_token(user_id, token_version):
+    # Первая часть токена — id пользователя: клиенты по ней разделяют свои кеши
+    payload = f"{user_id}.{int(time.time()) + TOKEN_TTL}.{token_version}"
+    return f"{payload}.{sign_token(payload)}"
+
+def parse_token(authorization):
+    # Проверяет подпись и срок действия без обращения к БД; возвращает (user_id, token_version)
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    # Заголовки декодируются как latin-1: всё, кроме ASCII-цифр и hex-подписи, отбрасывается
+    # до сравнения, иначе compare_digest падает на не-ASCII строке
+    match = TOKEN_PATTERN.fullmatch(authorization[len("Bearer "):])
+    if match is None:
+        return None
+    payload, signature = match.group(1), match.group(2)
+    if not hmac.compare_digest(signature, sign_token(payload)):
+        return None
+    user_id, expires_at, token_version = (int(part) for part in payload.split("."))
+    if expires_at < time.time():
+        return None
+    return user_id, token_version
+
+def user_from_token(authorization):
+    token = parse_token(authorization)
+    return token[0] if token else None
+
+def current_user(authorization: Optional[str] = Header(None)):
+    token = parse_token(authorization)
+    if token is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user_id, token_version = token
+
+    # Версия сверяется с БД, чтобы токены после выхода переставали действовать.
+    # Обычно она берётся из памяти, и повтор по Idempotency-Key не обращается к БД
+    current_version = token_versions.get(user_id)
+    if current_version is None:
+        conn = get_db_connection()
+        if not conn:
+            raise HTTPException(status_code=500, detail="Database connection failed")
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT token_version FROM users WHERE id = %s', (user_id,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+        if row is None:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        current_version = token_versions.put(user_id, row[0])
+
+    if current_version != token_version:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user_id
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+admission = AdmissionController(DB_MAX_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_WAIT)
+idempotency_store = IdempotencyStore(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
+token_versions = TokenVersionCache(TOKEN_VERSION_TTL, TOKEN_VERSION_MAX_USERS)
+search_index = SearchIndex(SEARCH_INDEX_MAX_DOCS)
+
+
+# Объявлен до CORS, чтобы ответы 429/503 тоже получали CORS-заголовки
+@app.middleware("http")
+async def limit_load(request: Request, call_next):
+    if request.url.path in UNLIMITED_PATHS or request.method == "OPTIONS":
+        return await call_next(request)
+
+    # Авторизованные клиенты ограничиваются по пользователю, остальные по адресу
+    user_id = user_from_token(request.headers.get("Authorization"))
+    if user_id is not None:
+        client = f"user:{user_id}"
+    else:
+        client = f"ip:{request.client.host if request.client else 'unknown'}"
+    wait = rate_limiter.acquire(client)
+    if wait:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+    return await admission.run(request, call_next)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    started = time.perf_counter()
+    response = await call_next(request)
+    duration_ms = (time.perf_counter() - started) * 1000
+
+    response.headers["X-Request-ID"] = request_id
+    response.headers["Server-Timing"] = f"app;dur={duration_ms:.1f}"
+    if request.url.path not in UNLIMITED_PATHS:
+        print(f"[{request_id}] {request.method} {request.url.path} -> {response.status_code} ({duration_ms:.1f} ms)")
+    return response
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "Retry-After", "Idempotent-Replayed"],
 )
 
 @app.get("/")
@@ -39,6 +651,20 @@ async def get_js():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/")
+async def get_metrics():
+    return {
+        "rate_limiter": rate_limiter.stats(),
+        "admission": admission.stats(),
+        "idempotency": idempotency_store.stats(),
+        "search_index": search_index.stats(),
+        "token_versions": token_versions.stats()
+    }
+
+class UserCredentials(BaseModel):
+    username: str
+    password: str
+
 class HabitCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -56,47 +682,269 @@ class HabitCompletion(BaseModel):
     craving_level: int = 0
     resistance_level: int = 0
 
+db_pool = None
+db_pool_lock = threading.Lock()
+
 def get_db_connection():
+    global db_pool
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            database="priv",
-            user="root",
-            password="123456789",
-            port=3306
-        )
-        return connection
+        with db_pool_lock:
+            if db_pool is None:
+                db_pool = pooling.MySQLConnectionPool(
+                    pool_name="habit_tracker",
+                    pool_size=DB_POOL_SIZE,
+                    host="localhost",
+                    database=os.environ.get("HABIT_TRACKER_DB", "priv"),
+                    user="root",
+                    password="123456789",
+                    port=3306
+                )
+        return db_pool.get_connection()
     except Error as e:
         print(f"Database connection error: {e}")
         return None
 
+def ensure_schema():
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(64) NOT NULL UNIQUE,
+                password_hash VARCHAR(128) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        for table, column_name, ddl in SCHEMA_COLUMNS:
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            ''', (table, column_name))
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(ddl)
+
+        for table, index_name, ddl in SCHEMA_INDEXES:
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            ''', (table, index_name))
+            if cursor.fetchone()[0] == 0:
+                cursor.execute(ddl)
+
+        for table, index_name in SCHEMA_DROPPED_INDEXES:
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            ''', (table, index_name))
+            if cursor.fetchone()[0] > 0:
+                cursor.execute(f'DROP INDEX {index_name} ON {table}')
+
+        conn.commit()
+    except Exception as e:
+        print(f"Schema migration error: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+def purge_deleted_habits():
+    conn = get_db_connection()
+    if not conn:
+        return
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT id FROM habits WHERE deleted_at IS NOT NULL')
+        habit_ids = [row[0] for row in cursor.fetchall()]
+
+        for habit_id in habit_ids:
+            # Удаляем отметки небольшими порциями, чтобы не держать длинные блокировки
+            while True:
+                cursor.execute(
+                    'DELETE FROM habit_completions WHERE habit_id = %s LIMIT %s',
+                    (habit_id, PURGE_BATCH_SIZE)
+                )
+                deleted = cursor.rowcount
+                conn.commit()
+                if deleted < PURGE_BATCH_SIZE:
+                    break
+
+            # Отметки, добавленные после последней порции, удаляются в одной транзакции с привычкой
+            cursor.execute('DELETE FROM habit_completions WHERE habit_id = %s', (habit_id,))
+            cursor.execute('DELETE FROM habits WHERE id = %s AND deleted_at IS NOT NULL', (habit_id,))
+            conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Purge error: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+# Создаются при старте в цикле событий сервера
+purge_loop = None
+purge_requested = None
+
+def request_purge():
+    # Обработчики работают в потоках пула, а asyncio.Event можно трогать только из цикла событий
+    if purge_loop is not None:
+        purge_loop.call_soon_threadsafe(purge_requested.set)
+
+async def purge_worker():
+    while True:
+        try:
+            await asyncio.wait_for(purge_requested.wait(), timeout=PURGE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        purge_requested.clear()
+        await asyncio.to_thread(purge_deleted_habits)
+
+@app.on_event("startup")
+async def on_startup():
+    global purge_loop, purge_requested
+    purge_loop = asyncio.get_running_loop()
+    purge_requested = asyncio.Event()
+    await asyncio.to_thread(ensure_schema)
+    app.state.purge_task = asyncio.create_task(purge_worker())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.purge_task.cancel()
+
+# Обработчики с обращением к БД объявлены через def: FastAPI выполняет их в пуле потоков,
+# поэтому блокирующий mysql.connector не останавливает цикл событий и лимит admission работает
+
+@app.post("/users/register/")
+def register_user(credentials: UserCredentials):
+    if not credentials.username.strip() or not credentials.password:
+        raise HTTPException(status_code=400, detail="Username and password are required")
+
+    password_hash = hash_password(credentials.password)
+
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'INSERT INTO users (username, password_hash) VALUES (%s, %s)',
+            (credentials.username.strip(), password_hash)
+        )
+        user_id = cursor.lastrowid
+
+        # Первый пользователь получает данные, созданные до появления учётных записей
+        cursor.execute('SELECT COUNT(*) FROM users')
+        if cursor.fetchone()[0] == 1:
+            cursor.execute('UPDATE habits SET user_id = %s WHERE user_id IS NULL', (user_id,))
+            cursor.execute('''
+                UPDATE habit_completions hc
+                JOIN habits h ON h.id = hc.habit_id
+                SET hc.user_id = h.user_id
+                WHERE hc.user_id IS NULL
+            ''')
+
+        conn.commit()
+        return {"id": user_id, "token": make_token(user_id, 0)}
+    except mysql.connector.IntegrityError:
+        conn.rollback()
+        raise HTTPException(status_code=409, detail="Username already taken")
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error registering user: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.post("/users/login/")
+def login_user(credentials: UserCredentials):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            'SELECT id, password_hash, token_version FROM users WHERE username = %s',
+            (credentials.username.strip(),)
+        )
+        user = cursor.fetchone()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error logging in: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    if user is None or not verify_password(credentials.password, user["password_hash"]):
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    return {"id": user["id"], "token": make_token(user["id"], user["token_version"])}
+
+@app.post("/users/logout/")
+def logout_user(user_id: int = Depends(current_user)):
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute('UPDATE users SET token_version = token_version + 1 WHERE id = %s', (user_id,))
+        cursor.execute('SELECT token_version FROM users WHERE id = %s', (user_id,))
+        token_version = cursor.fetchone()[0]
+        conn.commit()
+        token_versions.put(user_id, token_version)
+        return {"message": "Logged out"}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=f"Error logging out: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+
 @app.post("/habits/")
-async def create_habit(habit: HabitCreate):
+def create_habit(habit: HabitCreate, idempotency_key: Optional[str] = Header(None),
+                       user_id: int = Depends(current_user)):
+    key = f"{user_id}:create_habit:{idempotency_key}" if idempotency_key else None
+    stored = idempotency_store.begin(key, habit.dict())
+    if stored is not None:
+        return JSONResponse(content=stored, headers={"Idempotent-Replayed": "true"})
+
     conn = get_db_connection()
     if not conn:
+        idempotency_store.abort(key)
         raise HTTPException(status_code=500, detail="Database connection failed")
 
     cursor = conn.cursor()
     try:
         cursor.execute('''
-            INSERT INTO habits (name, description, habit_type, frequency, target_count, motivation_text, difficulty_level)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', (habit.name, habit.description, habit.habit_type, habit.frequency,
+            INSERT INTO habits (user_id, name, description, habit_type, frequency, target_count, motivation_text, difficulty_level)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', (user_id, habit.name, habit.description, habit.habit_type, habit.frequency,
               habit.target_count, habit.motivation_text, habit.difficulty_level))
 
         habit_id = cursor.lastrowid
+        cursor.execute('SELECT created_at FROM habits WHERE id = %s', (habit_id,))
+        created_at = cursor.fetchone()[0]
         conn.commit()
-        return {"id": habit_id, "message": "Habit created successfully"}
+        search_index.update(user_id, lambda tenant: tenant.put_habit(
+            habit_id, habit.name, habit.description, habit.motivation_text,
+            habit.difficulty_level, habit.frequency, created_at))
+        response = {"id": habit_id, "message": "Habit created successfully"}
+        idempotency_store.finish(key, response)
+        return response
 
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error creating habit: {str(e)}")
     finally:
+        idempotency_store.abort(key)
         cursor.close()
         conn.close()
 
 @app.get("/habits/")
-async def get_habits():
+def get_habits(user_id: int = Depends(current_user)):
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -108,8 +956,9 @@ async def get_habits():
                    motivation_text, difficulty_level,
                    DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') as created_at
             FROM habits 
+            WHERE user_id = %s AND deleted_at IS NULL
             ORDER BY created_at DESC
-        ''')
+        ''', (user_id,))
         habits = cursor.fetchall()
         return habits
     except Exception as e:
@@ -119,35 +968,63 @@ async def get_habits():
         conn.close()
 
 @app.post("/habits/complete/")
-async def complete_habit(completion: HabitCompletion):
+def complete_habit(completion: HabitCompletion, idempotency_key: Optional[str] = Header(None),
+                         user_id: int = Depends(current_user)):
+    key = f"{user_id}:complete_habit:{idempotency_key}" if idempotency_key else None
+    stored = idempotency_store.begin(key, completion.dict())
+    if stored is not None:
+        return JSONResponse(content=stored, headers={"Idempotent-Replayed": "true"})
+
     conn = get_db_connection()
     if not conn:
+        idempotency_store.abort(key)
         raise HTTPException(status_code=500, detail="Database connection failed")
 
     cursor = conn.cursor()
     try:
+        # Блокировка строки не даёт пометить привычку удалённой, пока отметка не записана
+        cursor.execute(
+            'SELECT id FROM habits WHERE id = %s AND user_id = %s AND deleted_at IS NULL LOCK IN SHARE MODE',
+            (completion.habit_id, user_id)
+        )
+        if cursor.fetchone() is None:
+            raise HTTPException(status_code=404, detail="Habit not found")
+
         cursor.execute('''
-            INSERT INTO habit_completions (habit_id, completion_date, completed, notes, craving_level, resistance_level)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            INSERT INTO habit_completions (user_id, habit_id, completion_date, completed, notes, craving_level, resistance_level)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE 
             completed = VALUES(completed), 
             notes = VALUES(notes),
             craving_level = VALUES(craving_level),
             resistance_level = VALUES(resistance_level)
-        ''', (completion.habit_id, completion.completion_date, completion.completed,
+        ''', (user_id, completion.habit_id, completion.completion_date, completion.completed,
               completion.notes, completion.craving_level, completion.resistance_level))
+        # При обновлении существующей отметки lastrowid не указывает на неё
+        cursor.execute(
+            'SELECT id, completion_date FROM habit_completions WHERE habit_id = %s AND completion_date = %s',
+            (completion.habit_id, completion.completion_date)
+        )
+        completion_id, completion_date = cursor.fetchone()
 
         conn.commit()
-        return {"message": "Habit completion recorded"}
+        search_index.update(user_id, lambda tenant: tenant.put_note(
+            completion_id, completion.habit_id, completion_date, completion.notes))
+        response = {"message": "Habit completion recorded"}
+        idempotency_store.finish(key, response)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error recording completion: {str(e)}")
     finally:
+        idempotency_store.abort(key)
         cursor.close()
         conn.close()
 
 @app.get("/analytics/")
-async def get_analytics():
+def get_analytics(user_id: int = Depends(current_user)):
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -159,10 +1036,11 @@ async def get_analytics():
         cursor.execute('''
             SELECT h.id, h.name, COUNT(hc.id) as completed_count
             FROM habits h
-            LEFT JOIN habit_completions hc ON h.id = hc.habit_id 
+            LEFT JOIN habit_completions hc ON hc.user_id = h.user_id AND h.id = hc.habit_id 
             AND hc.completion_date >= %s AND hc.completed = TRUE
+            WHERE h.user_id = %s AND h.deleted_at IS NULL
             GROUP BY h.id, h.name
-        ''', (thirty_days_ago,))
+        ''', (thirty_days_ago, user_id))
 
         stats = cursor.fetchall()
 
@@ -173,7 +1051,8 @@ async def get_analytics():
                 SUM(CASE WHEN frequency = 'weekly' THEN 1 ELSE 0 END) as weekly_habits,
                 SUM(CASE WHEN frequency = 'monthly' THEN 1 ELSE 0 END) as monthly_habits
             FROM habits
-        ''')
+            WHERE user_id = %s AND deleted_at IS NULL
+        ''', (user_id,))
 
         total_stats = cursor.fetchone()
 
@@ -198,7 +1077,7 @@ async def get_analytics():
         conn.close()
 
 @app.get("/habits/{habit_id}/completions/")
-async def get_habit_completions(habit_id: int):
+def get_habit_completions(habit_id: int, user_id: int = Depends(current_user)):
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
@@ -206,13 +1085,15 @@ async def get_habit_completions(habit_id: int):
     cursor = conn.cursor(dictionary=True)
     try:
         cursor.execute('''
-            SELECT id, habit_id, completion_date, completed, notes, craving_level, resistance_level,
-                   DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') as created_at
-            FROM habit_completions 
-            WHERE habit_id = %s 
-            ORDER BY completion_date DESC
+            SELECT hc.id, hc.habit_id, hc.completion_date, hc.completed, hc.notes,
+                   hc.craving_level, hc.resistance_level,
+                   DATE_FORMAT(hc.created_at, '%%Y-%%m-%%d %%H:%%i:%%s') as created_at
+            FROM habit_completions hc
+            JOIN habits h ON h.id = hc.habit_id AND h.deleted_at IS NULL
+            WHERE hc.user_id = %s AND hc.habit_id = %s 
+            ORDER BY hc.completion_date DESC
             LIMIT 10
-        ''', (habit_id,))
+        ''', (user_id, habit_id))
         completions = cursor.fetchall()
         return completions
     except Exception as e:
@@ -221,21 +1102,139 @@ async def get_habit_completions(habit_id: int):
         cursor.close()
         conn.close()
 
+def build_search_index(cursor, user_id):
+    tenant = TenantSearchIndex()
+    cursor.execute('''
+        SELECT id, name, description, motivation_text, difficulty_level, frequency, created_at
+        FROM habits
+        WHERE user_id = %s AND deleted_at IS NULL
+    ''', (user_id,))
+    for row in cursor.fetchall():
+        tenant.put_habit(row["id"], row["name"], row["description"], row["motivation_text"],
+                         row["difficulty_level"], row["frequency"], row["created_at"])
+
+    cursor.execute('''
+        SELECT hc.id, hc.habit_id, hc.completion_date, hc.notes
+        FROM habit_completions hc
+        JOIN habits h ON h.id = hc.habit_id AND h.deleted_at IS NULL
+        WHERE hc.user_id = %s AND hc.notes IS NOT NULL AND hc.notes <> ''
+    ''', (user_id,))
+    for row in cursor.fetchall():
+        tenant.put_note(row["id"], row["habit_id"], row["completion_date"], row["notes"])
+    return tenant
+
+def fetch_in_order(cursor, sql, user_id, ids):
+    # Строки страницы читаются по первичному ключу и возвращаются в порядке ранжирования
+    if not ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(ids))
+    cursor.execute(sql.format(ids=placeholders), (user_id, *ids))
+    rows = {row["id"]: row for row in cursor.fetchall()}
+    return [rows[row_id] for row_id in ids if row_id in rows]
+
+@app.get("/search/")
+def search(q: str = "", difficulty: Optional[str] = None, frequency: Optional[str] = None,
+           limit: int = 20, offset: int = 0, notes_limit: int = 20, notes_offset: int = 0,
+           user_id: int = Depends(current_user)):
+    # Привычки и заметки листаются независимо
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    notes_limit = max(1, min(notes_limit, SEARCH_MAX_LIMIT))
+    notes_offset = max(0, notes_offset)
+    words = search_words(q)
+
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if words:
+            # Каждое слово обязательно и ищется по префиксу в индексе пользователя,
+            # поэтому другие пользователи на цену поиска не влияют
+            tenant = search_index.get(user_id)
+            if tenant is None:
+                search_index.begin_build(user_id)
+                try:
+                    tenant = build_search_index(cursor, user_id)
+                finally:
+                    search_index.finish_build(user_id, tenant)
+
+            with tenant.lock:
+                habit_ids = tenant.search_habits(words, difficulty, frequency, limit, offset)
+                note_ids = tenant.search_notes(words, difficulty, frequency, notes_limit, notes_offset)
+
+            habits = fetch_in_order(cursor, '''
+                SELECT id, name, description, habit_type, frequency, target_count,
+                       motivation_text, difficulty_level,
+                       DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') as created_at
+                FROM habits
+                WHERE user_id = %s AND deleted_at IS NULL AND id IN ({ids})
+            ''', user_id, habit_ids)
+            notes = fetch_in_order(cursor, '''
+                SELECT hc.id, hc.habit_id, h.name as habit_name, hc.completion_date, hc.notes
+                FROM habit_completions hc
+                JOIN habits h ON h.id = hc.habit_id AND h.deleted_at IS NULL
+                WHERE hc.user_id = %s AND hc.id IN ({ids})
+            ''', user_id, note_ids)
+        else:
+            filters = "user_id = %s AND deleted_at IS NULL"
+            filter_params = [user_id]
+            if difficulty:
+                filters += " AND difficulty_level = %s"
+                filter_params.append(difficulty)
+            if frequency:
+                filters += " AND frequency = %s"
+                filter_params.append(frequency)
+
+            cursor.execute(f'''
+                SELECT id, name, description, habit_type, frequency, target_count,
+                       motivation_text, difficulty_level,
+                       DATE_FORMAT(created_at, '%%Y-%%m-%%d %%H:%%i:%%s') as created_at
+                FROM habits
+                WHERE {filters}
+                ORDER BY created_at DESC
+                LIMIT %s OFFSET %s
+            ''', (*filter_params, limit, offset))
+            habits = cursor.fetchall()
+            notes = []
+
+        return {
+            "habits": habits,
+            "notes": notes,
+            "limit": limit,
+            "offset": offset,
+            "notes_limit": notes_limit,
+            "notes_offset": notes_offset
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching habits: {str(e)}")
+    finally:
+        cursor.close()
+        conn.close()
+
 @app.delete("/habits/{habit_id}")
-async def delete_habit(habit_id: int):
+def delete_habit(habit_id: int, user_id: int = Depends(current_user)):
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
 
     cursor = conn.cursor()
     try:
-        cursor.execute('DELETE FROM habits WHERE id = %s', (habit_id,))
+        cursor.execute(
+            'UPDATE habits SET deleted_at = NOW() WHERE id = %s AND user_id = %s AND deleted_at IS NULL',
+            (habit_id, user_id)
+        )
         conn.commit()
 
         if cursor.rowcount == 0:
             raise HTTPException(status_code=404, detail="Habit not found")
 
+        search_index.update(user_id, lambda tenant: tenant.remove_habit(habit_id))
+        request_purge()
         return {"message": "Habit deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting habit: {str(e)}")
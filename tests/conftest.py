@@ -0,0 +1,4 @@
+import os
+
+# Иначе импорт server создаст файл с секретом рядом с исходниками
+os.environ.setdefault("HABIT_TRACKER_SECRET", "test-secret")
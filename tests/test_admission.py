@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+import server
+
+
+async def respond_ok(request):
+    return "ok"
+
+
+def test_sheds_with_retry_after_when_queue_is_full():
+    async def scenario():
+        admission = server.AdmissionController(max_concurrency=1, max_queue=0, max_queue_wait=2.0)
+        return admission, await admission.run(None, respond_ok)
+
+    admission, response = asyncio.run(scenario())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+    assert admission.shed == 1
+
+
+def test_sheds_with_retry_after_when_queue_wait_expires():
+    async def scenario():
+        admission = server.AdmissionController(max_concurrency=1, max_queue=5, max_queue_wait=0.05)
+        release = asyncio.Event()
+
+        async def slow(request):
+            await release.wait()
+            return "ok"
+
+        holder = asyncio.create_task(admission.run(None, slow))
+        await asyncio.sleep(0)
+        shed = await admission.run(None, respond_ok)
+        release.set()
+        return admission, shed, await holder
+
+    admission, shed, held = asyncio.run(scenario())
+    assert shed.status_code == 503
+    assert shed.headers["Retry-After"] == "1"
+    assert held == "ok"
+    assert admission.admitted == 1
+    assert admission.in_flight == 0
+
+
+def test_admits_when_slot_is_free():
+    async def scenario():
+        admission = server.AdmissionController(max_concurrency=2, max_queue=5, max_queue_wait=1.0)
+        return admission, await admission.run(None, respond_ok)
+
+    admission, response = asyncio.run(scenario())
+    assert response == "ok"
+    assert admission.shed == 0
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+from fastapi import HTTPException
+
+import server
+
+
+def test_replays_finished_response():
+    store = server.IdempotencyStore(ttl=60, max_keys=10)
+    assert store.begin("k", {"name": "a"}) is None
+    store.finish("k", {"id": 1})
+    assert store.begin("k", {"name": "a"}) == {"id": 1}
+    assert store.replayed == 1
+
+
+def test_rejects_duplicate_while_in_progress():
+    store = server.IdempotencyStore(ttl=60, max_keys=10)
+    store.begin("k", {"name": "a"})
+    with pytest.raises(HTTPException) as error:
+        store.begin("k", {"name": "a"})
+    assert error.value.status_code == 409
+
+
+def test_rejects_key_reused_with_other_payload():
+    store = server.IdempotencyStore(ttl=60, max_keys=10)
+    store.begin("k", {"name": "a"})
+    store.finish("k", {"id": 1})
+    with pytest.raises(HTTPException) as error:
+        store.begin("k", {"name": "b"})
+    assert error.value.status_code == 422
+
+
+def test_abort_forgets_only_unfinished_requests():
+    store = server.IdempotencyStore(ttl=60, max_keys=10)
+    store.begin("k", {"name": "a"})
+    store.abort("k")
+    assert store.begin("k", {"name": "a"}) is None
+
+    store.finish("k", {"id": 1})
+    store.abort("k")
+    assert store.begin("k", {"name": "a"}) == {"id": 1}
+
+
+def test_expires_by_ttl_and_size():
+    store = server.IdempotencyStore(ttl=0, max_keys=10)
+    store.begin("k", {"name": "a"})
+    store.finish("k", {"id": 1})
+    assert store.begin("k", {"name": "a"}) is None
+
+    store = server.IdempotencyStore(ttl=60, max_keys=2)
+    for key in ("a", "b", "c"):
+        store.begin(key, {})
+        store.finish(key, {"key": key})
+    assert store.stats()["keys"] == 2
+    assert store.begin("a", {}) is None
+    assert store.begin("c", {}) == {"key": "c"}
+
+
+def test_requests_without_key_are_not_stored():
+    store = server.IdempotencyStore(ttl=60, max_keys=10)
+    assert store.begin(None, {"name": "a"}) is None
+    store.finish(None, {"id": 1})
+    assert store.stats()["keys"] == 0
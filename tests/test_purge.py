@@ -0,0 +1,23 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+import server
+
+
+def test_request_from_worker_thread_wakes_the_loop(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "purge_loop", asyncio.get_running_loop())
+        monkeypatch.setattr(server, "purge_requested", asyncio.Event())
+        started = time.monotonic()
+        await asyncio.gather(
+            asyncio.wait_for(server.purge_requested.wait(), timeout=3),
+            asyncio.to_thread(server.request_purge),
+        )
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 1
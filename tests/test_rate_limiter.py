@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+import server
+
+
+def test_rejects_after_burst_with_wait():
+    limiter = server.RateLimiter(rate=1.0, capacity=2, max_clients=10)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0
+    wait = limiter.acquire("a")
+    assert 0 < wait <= 1
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_clients_have_separate_buckets():
+    limiter = server.RateLimiter(rate=1.0, capacity=1, max_clients=10)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("b") == 0
+
+
+def test_evicts_least_recently_used_client():
+    limiter = server.RateLimiter(rate=1.0, capacity=1, max_clients=2)
+    limiter.acquire("a")
+    limiter.acquire("b")
+    # «a» использован последним, поэтому новый клиент вытесняет «b»
+    limiter.acquire("a")
+    limiter.acquire("c")
+    assert list(limiter.buckets) == ["a", "c"]
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+import server
+
+
+def make_index():
+    index = server.TenantSearchIndex()
+    index.put_habit(1, "Курение", "Бросить курить", "Здоровье", "hard", "daily", "2026-01-01 00:00:00")
+    index.put_habit(2, "Сладкое", "Меньше курительных пауз", None, "easy", "weekly", "2026-01-02 00:00:00")
+    index.put_note(10, 1, "2026-01-03", "Сильная тяга после кофе")
+    index.put_note(11, 1, "2026-01-04", "Тяга слабее")
+    index.put_note(12, 2, "2026-01-05", "Кофе без сахара")
+    return index
+
+
+def test_ranks_name_matches_first_and_matches_prefixes():
+    index = make_index()
+    assert index.search_habits(["кур"], None, None, 20, 0) == [1, 2]
+
+
+def test_requires_every_word():
+    index = make_index()
+    assert index.search_notes(["тяга", "кофе"], None, None, 20, 0) == [10]
+    assert index.search_notes(["кофе"], None, None, 20, 0) == [12, 10]
+
+
+def test_filters_and_pages():
+    index = make_index()
+    assert index.search_habits(["кур"], None, "weekly", 20, 0) == [2]
+    assert index.search_notes(["тяга"], "hard", None, 1, 1) == [10]
+
+
+def test_note_update_replaces_words_and_habit_removal_drops_notes():
+    index = make_index()
+    index.put_note(10, 1, "2026-01-03", "Спокойный день")
+    assert index.search_notes(["тяга"], None, None, 20, 0) == [11]
+    assert "сильная" not in index.words
+
+    index.remove_habit(1)
+    assert index.search_notes(["тяга"], None, None, 20, 0) == []
+    assert index.search_habits(["курение"], None, None, 20, 0) == []
+    assert index.size() == 2
+
+
+def test_discards_build_that_overlapped_a_write():
+    search_index = server.SearchIndex(max_docs=100)
+    search_index.begin_build(7)
+    search_index.update(7, lambda tenant: tenant.put_note(1, 1, "2026-01-01", "новая"))
+    search_index.finish_build(7, make_index())
+    assert search_index.get(7) is None
+
+    search_index.begin_build(7)
+    search_index.finish_build(7, make_index())
+    assert search_index.get(7) is not None
+
+
+def test_evicts_least_recently_searched_tenant():
+    search_index = server.SearchIndex(max_docs=8)
+    for user_id in (1, 2):
+        search_index.begin_build(user_id)
+        search_index.finish_build(user_id, make_index())
+    assert search_index.get(1) is None
+    assert search_index.get(2) is not None
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("mysql.connector")
+
+from fastapi import HTTPException
+
+import server
+
+
+def bearer(token):
+    return f"Bearer {token}"
+
+
+def test_accepts_valid_token():
+    token = server.make_token(7, 3)
+    assert token.split(".")[0] == "7"
+    assert server.parse_token(bearer(token)) == (7, 3)
+    assert server.user_from_token(bearer(token)) == 7
+
+
+def test_rejects_tampered_token():
+    user_id, expires_at, version, signature = server.make_token(7, 3).split(".")
+    assert server.parse_token(bearer(f"8.{expires_at}.{version}.{signature}")) is None
+    assert server.parse_token(bearer(f"{user_id}.{expires_at}.4.{signature}")) is None
+    assert server.parse_token(bearer(f"{user_id}.{expires_at}.{version}.{'0' * 64}")) is None
+
+
+def test_rejects_expired_token(monkeypatch):
+    monkeypatch.setattr(server, "TOKEN_TTL", -1)
+    assert server.parse_token(bearer(server.make_token(7, 0))) is None
+
+
+@pytest.mark.parametrize("authorization", [
+    None,
+    "",
+    "Token 1.2.3.abc",
+    "Bearer 1.2.3.\xe9",
+    "Bearer \xb2.2.3." + "0" * 64,
+    "Bearer 1.2." + "0" * 64,
+])
+def test_rejects_malformed_header_without_raising(authorization):
+    assert server.parse_token(authorization) is None
+
+
+def test_current_user_rejects_revoked_version(monkeypatch):
+    cache = server.TokenVersionCache(ttl=60, max_users=10)
+    cache.put(7, 4)
+    monkeypatch.setattr(server, "token_versions", cache)
+
+    assert server.current_user(bearer(server.make_token(7, 4))) == 7
+    with pytest.raises(HTTPException) as error:
+        server.current_user(bearer(server.make_token(7, 3)))
+    assert error.value.status_code == 401
+
+
+def test_token_version_cache_never_goes_back():
+    cache = server.TokenVersionCache(ttl=60, max_users=10)
+    cache.put(7, 5)
+    assert cache.put(7, 4) == 5
+    assert cache.get(7) == 5